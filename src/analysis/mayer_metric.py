@@ -9,10 +9,13 @@ def get_mayer_score(freqs, powers):
     idx = (freqs >= low) & (freqs <= high)
     
     # Use scipy.integrate.trapezoid to avoid numpy deprecation
-    mayer_p = scipy.integrate.trapezoid(powers[idx], freqs[idx])
-    total_p = scipy.integrate.trapezoid(powers[1:], freqs[1:])
+    # powers may be a (n_surrogates, n_freqs) batch; integrate along the last axis
+    mayer_p = scipy.integrate.trapezoid(powers[..., idx], freqs[idx])
+    total_p = scipy.integrate.trapezoid(powers[..., 1:], freqs[1:])
     
-    return mayer_p / total_p if total_p > 0 else 0.0
+    if np.ndim(total_p) == 0:
+        return mayer_p / total_p if total_p > 0 else 0.0
+    return np.divide(mayer_p, total_p, out=np.zeros_like(mayer_p), where=total_p > 0)
 
 def get_peak_freq(freqs, powers):
     valid = np.where(freqs > 0.02)
@@ -3,18 +3,48 @@ import librosa
 import scipy.signal
 
 class PhraseDetector:
-    def __init__(self, sr=22050):
+    def __init__(self, sr=22050, hop_length=512):
         self.sr = sr
+        self.hop_length = hop_length
+
+    @property
+    def fps(self):
+        return self.sr / self.hop_length
 
     def detect(self, y, min_period=8.0, max_period=13.0):
-        chroma = librosa.feature.chroma_cqt(y=y, sr=self.sr, hop_length=512)
-        chroma_stack = librosa.feature.stack_memory(chroma, n_steps=10, delay=3)
-        rec = librosa.segment.recurrence_matrix(chroma_stack, mode='affinity', sym=True)
-        lag_pad = librosa.segment.recurrence_to_lag(rec, pad=False)
+        lag_pad = self.lag_matrix(self.chroma(y))
         structure_curve = np.sum(lag_pad, axis=1)
         
-        hop_length = 512
-        fps = self.sr / hop_length
+        return self.pick_period(structure_curve, min_period, max_period)
+
+    def chroma(self, y):
+        chroma = librosa.feature.chroma_cqt(y=y, sr=self.sr, hop_length=self.hop_length)
+        return librosa.feature.stack_memory(chroma, n_steps=10, delay=3)
+
+    def lag_matrix(self, chroma_stack):
+        # Rows are lags, columns are time frames.
+        rec = librosa.segment.recurrence_matrix(chroma_stack, mode='affinity', sym=True)
+        return librosa.segment.recurrence_to_lag(rec, pad=False)
+
+    def lag_matrix_limited(self, chroma_stack, max_period=13.0):
+        # Lag-limited variant: only the first max_period seconds of lag are
+        # evaluated, so memory grows with N instead of N^2 for long tracks.
+        feats = librosa.util.normalize(chroma_stack, axis=0)
+        
+        n = feats.shape[1]
+        max_lag = min(int(max_period * self.fps) + 1, n - 1)
+        
+        # Frame t at lag l is compared with frame t - l; the first l frames
+        # have no partner and stay zero instead of wrapping to the end.
+        lag = np.zeros((max(max_lag, 0) + 1, n), dtype=np.float32)
+        lag[0] = np.clip(np.sum(feats * feats, axis=0), 0, None)
+        for l in range(1, max_lag + 1):
+            sim = np.sum(feats[:, l:] * feats[:, :-l], axis=0)
+            lag[l, l:] = np.clip(sim, 0, None)
+        return lag
+
+    def pick_period(self, structure_curve, min_period=8.0, max_period=13.0):
+        fps = self.fps
         min_bin = int(min_period * fps)
         max_bin = int(max_period * fps)
         
@@ -34,4 +64,3 @@ class PhraseDetector:
         curve = structure_curve / (np.max(structure_curve) + 1e-9)
         
         return best_period, times, curve
-
@@ -6,16 +6,21 @@ import scipy.signal
 import os
 
 class Structure:
-    def __init__(self, sr=22050):
+    def __init__(self, sr=22050, hop_length=512):
         self.sr = sr
+        self.hop_length = hop_length
 
-    def get_modulation(self, y):
+    def get_envelope(self, y, target_sr=10):
         analytic = scipy.signal.hilbert(y)
         env = np.abs(analytic)
         
-        target_sr = 10
         samples = int((len(y) / self.sr) * target_sr)
-        env_res = scipy.signal.resample(env, samples)
+        return scipy.signal.resample(env, samples)
+
+    def get_modulation(self, y, env_res=None, target_sr=10):
+        samples = int((len(y) / self.sr) * target_sr)
+        if env_res is None:
+            env_res = self.get_envelope(y, target_sr)
         
         onset = librosa.onset.onset_strength(y=y, sr=self.sr)
         onset_res = scipy.signal.resample(onset, samples)
@@ -27,8 +32,13 @@ class Structure:
         return freqs, p_vol, p_rhythm
 
     def get_ssm(self, y):
-        chroma = librosa.feature.chroma_cqt(y=y, sr=self.sr, hop_length=512)
+        chroma = librosa.feature.chroma_cqt(y=y, sr=self.sr, hop_length=self.hop_length)
         chroma_stack = librosa.feature.stack_memory(chroma, n_steps=10, delay=3)
+        return self.ssm_from_chroma(chroma_stack)
+
+    def ssm_from_chroma(self, chroma_stack, seconds=None):
+        if seconds is not None:
+            chroma_stack = chroma_stack[:, :int(seconds * self.sr / self.hop_length) + 1]
         return librosa.segment.recurrence_matrix(chroma_stack, mode='affinity', sym=True)
 
     def plot_dashboard(self, y, title, filename):
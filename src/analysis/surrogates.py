@@ -0,0 +1,184 @@
+import numpy as np
+import scipy.linalg
+import scipy.signal
+import scipy.ndimage
+from src.analysis.mayer_metric import get_mayer_score
+
+def phase_randomise(x, n_surrogates, rng, amplitudes=None):
+    # One batched rfft/irfft: every surrogate keeps |X(f)| (or the supplied
+    # amplitudes) and draws fresh uniform phases.
+    n = len(x)
+    amp = np.abs(np.fft.rfft(x - np.mean(x))) if amplitudes is None else amplitudes
+
+    phases = rng.uniform(0, 2 * np.pi, size=(n_surrogates, len(amp)))
+    phases[:, 0] = 0
+    if n % 2 == 0:
+        phases[:, -1] = 0
+
+    return np.fft.irfft(amp * np.exp(1j * phases), n=n, axis=-1)
+
+def amplitude_adjust(surrogates, x):
+    # Rank-remap each surrogate onto the sorted values of x (one AAFT pass),
+    # so spiky curves keep their value distribution as well as their spectrum.
+    ranks = np.argsort(np.argsort(surrogates, axis=-1), axis=-1)
+    return np.sort(x)[ranks]
+
+def smoothed_spectrum(x, width=None):
+    # Median-smoothed |X(f)|: keeps the colour of x but removes narrow lines,
+    # i.e. the periodicity whose significance is being tested.
+    amp = np.abs(np.fft.rfft(x - np.mean(x)))
+    width = width or max(3, len(amp) // 16)
+    return scipy.ndimage.median_filter(amp, size=width, mode='nearest')
+
+def ar1_coefficient(x):
+    # Lag-1 autocorrelation along the last axis, clipped to a stationary AR(1).
+    x = x - np.mean(x, axis=-1, keepdims=True)
+    phi = np.sum(x[..., 1:] * x[..., :-1], axis=-1) / (np.sum(x * x, axis=-1) + 1e-12)
+    return np.clip(phi, 0.0, 0.99)
+
+def red_noise(x, n_surrogates, rng):
+    # AR(1) surrogates with the lag-1 autocorrelation of x, filtered from a
+    # (n_surrogates, n) block of white noise in one call. The first sample is
+    # drawn from the stationary distribution so there is no start-up transient.
+    phi = ar1_coefficient(x)
+    white = rng.standard_normal((n_surrogates, len(x)))
+    white[:, 0] /= np.sqrt(1 - phi ** 2)
+    return scipy.signal.lfilter([1.0], [1.0, -phi], white, axis=-1)
+
+def ar1_spectrum(freqs, phi, fs):
+    # Theoretical AR(1) spectral shape at freqs, one row per value of phi.
+    w = 2 * np.pi * np.asarray(freqs) / fs
+    phi = np.asarray(phi, dtype=float)[..., None]
+    return 1.0 / (1 - 2 * phi * np.cos(w) + phi ** 2)
+
+def ar_fit(x, max_order):
+    # Yule-Walker AR coefficients, order chosen by AIC, and the centred
+    # innovations the fitted filter leaves behind.
+    x = x - np.mean(x)
+    n = len(x)
+    max_order = max(1, min(max_order, n // 4))
+    acov = np.array([np.dot(x[:n - k], x[k:]) for k in range(max_order + 1)]) / n
+
+    best_aic, coeffs = np.inf, np.zeros(1)
+    for order in range(1, max_order + 1):
+        a = scipy.linalg.solve_toeplitz(acov[:order], acov[1:order + 1])
+        var = acov[0] - a @ acov[1:order + 1]
+        aic = n * np.log(max(var, 1e-12)) + 2 * order
+        if aic < best_aic:
+            best_aic, coeffs = aic, a
+
+    resid = scipy.signal.lfilter(np.r_[1.0, -coeffs], [1.0], x)[len(coeffs):]
+    return coeffs, resid - np.mean(resid)
+
+def ar_resample(coeffs, resid, n, n_surrogates, rng, burn_in=200):
+    # Re-runs the fitted AR filter on resampled innovations, whole batch at once
+    innov = rng.choice(resid, size=(n_surrogates, n + burn_in))
+    return scipy.signal.lfilter([1.0], np.r_[1.0, -coeffs], innov, axis=-1)[:, burn_in:]
+
+def p_value(observed, null):
+    return float((1 + np.sum(null >= observed)) / (len(null) + 1))
+
+class SurrogateTester:
+    def __init__(self, n_surrogates=500, alpha=0.05, env_sr=10, batch_size=100, seed=None):
+        self.n_surrogates = n_surrogates
+        self.alpha = alpha
+        self.env_sr = env_sr
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+
+    def test_mayer(self, env):
+        # p-value: the statistic is the score minus the score an AR(1) process
+        # with the envelope's own lag-1 autocorrelation would have, so the red
+        # noise baseline is removed. Each AR(1) surrogate re-estimates its
+        # coefficient the same way, which keeps the test calibrated when phi
+        # is only known from the data. CI: AR-residual bootstrap. Series are
+        # regenerated from an AR model (up to 5 s of lags) fitted to the
+        # envelope, and the spread of their scores is centred on the observed
+        # score, so every track length gets a CI.
+        freqs, ps = self._psd(env)
+        score = get_mayer_score(freqs, ps)
+
+        def excess(x, scores):
+            return scores - get_mayer_score(freqs, ar1_spectrum(freqs, ar1_coefficient(x), self.env_sr))
+
+        def null_excess(b):
+            sur = red_noise(env, b, self.rng)
+            return excess(sur, get_mayer_score(freqs, self._psd(sur)[1]))
+
+        null = self._batched(null_excess)
+        observed = float(excess(env, score))
+
+        coeffs, resid = ar_fit(env, max_order=int(5 * self.env_sr))
+        boot = None
+        if len(resid) > 1:
+            boot = self._batched(lambda b: get_mayer_score(freqs, self._psd(ar_resample(coeffs, resid, len(env), b, self.rng))[1]))
+            boot = score + boot - np.median(boot)
+
+        return self._summary("score", score, null, boot, observed_stat=observed)
+
+    def test_period(self, lag, fps, min_period=8.0, max_period=13.0, harmonics=3):
+        # lag is the (lags x frames) matrix from PhraseDetector. The statistic
+        # is a comb over the detrended lag curve: the best mean height at a
+        # candidate period and its multiples. The null curves share the
+        # smoothed spectrum and value distribution of the observed one but not
+        # its periodicity. The CI is a block bootstrap over time frames, which
+        # reweights the columns of lag.
+        curve = np.sum(lag, axis=1)
+        min_bin, max_bin = int(min_period * fps), min(int(max_period * fps), len(curve) - 1)
+        if min_bin >= max_bin:
+            return self._summary("period", 0.0, None, None)
+
+        period = (min_bin + np.argmax(curve[min_bin:max_bin])) / fps
+
+        start, stop = min_bin // 2, min(len(curve), (harmonics + 1) * max_bin)
+        resid = curve - scipy.ndimage.uniform_filter1d(curve, size=max_bin, mode='nearest')
+        resid = resid[start:stop]
+        resid = (resid - np.mean(resid)) / (np.std(resid) + 1e-12)
+
+        bins = np.arange(min_bin, max_bin)
+        k = np.arange(1, harmonics + 1)
+        comb = bins[:, None] * k[None, :] - start
+        valid = comb < len(resid)
+        comb = np.where(valid, comb, 0)
+
+        def comb_peak(r):
+            heights = np.where(valid, r[..., comb], 0).sum(axis=-1) / valid.sum(axis=-1)
+            return np.max(heights, axis=-1)
+
+        amp = smoothed_spectrum(resid)
+        null = self._batched(lambda b: comb_peak(amplitude_adjust(phase_randomise(resid, b, self.rng, amplitudes=amp), resid)))
+
+        n = lag.shape[1]
+        block = max(1, max_bin)
+        n_blocks = int(np.ceil(n / block))
+        sub = np.asarray(lag[:max_bin], dtype=np.float32)
+
+        def boot_periods(b):
+            counts = self.rng.multinomial(n_blocks, np.full(n_blocks, 1 / n_blocks), size=b)
+            weights = np.repeat(counts, block, axis=1)[:, :n].astype(np.float32)
+            curves = weights @ sub.T
+            return (min_bin + np.argmax(curves[:, min_bin:max_bin], axis=1)) / fps
+
+        boot = self._batched(boot_periods)
+
+        return self._summary("period", period, null, boot, observed_stat=comb_peak(resid))
+
+    def _psd(self, env):
+        nperseg = min(1024, env.shape[-1])
+        return scipy.signal.welch(env, fs=self.env_sr, nperseg=nperseg, scaling='density', axis=-1)
+
+    def _batched(self, fn):
+        out = []
+        for done in range(0, self.n_surrogates, self.batch_size):
+            out.append(fn(min(self.batch_size, self.n_surrogates - done)))
+        return np.concatenate(out) if out else np.array([])
+
+    def _summary(self, key, value, null, boot, observed_stat=None):
+        if null is None or len(null) == 0:
+            return {key: float(value), "p_value": np.nan, "ci_low": np.nan, "ci_high": np.nan}
+
+        stat = value if observed_stat is None else observed_stat
+        low, high = np.nan, np.nan
+        if boot is not None and len(boot):
+            low, high = np.quantile(boot, [self.alpha / 2, 1 - self.alpha / 2])
+        return {key: float(value), "p_value": p_value(stat, null), "ci_low": float(low), "ci_high": float(high)}
@@ -6,45 +6,94 @@ import plotly.express as px
 import plotly.graph_objects as go
 import os
 import sys
+import uuid
+import tempfile
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from src.analysis.signal_processing import SpectralAnalyzer
-from src.analysis.mayer_metric import calculate_mayer_score
+from src.dashboard.batch_runner import BatchRunner
 from src.analysis.biomimetic_model import BaroreflexSimulator
 from src.generation.synthesizer import BioResonanceComposer
+from src.utils.config_loader import load_config
 
 st.set_page_config(page_title="Bio-Musical Rhythms", page_icon="🫀", layout="wide")
 
+@st.cache_resource
+def get_runner():
+    # One bounded pool for the whole server, shared by all sessions
+    conf = load_config()['dashboard']
+    return BatchRunner(max_workers=conf['max_workers'], max_finished=conf['max_finished_jobs'],
+                       session_ttl_s=conf['session_ttl_s'])
+
+def save_upload(uploaded):
+    suffix = os.path.splitext(uploaded.name)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload_")
+    with os.fdopen(fd, "wb") as f:
+        f.write(uploaded.getbuffer())
+    return path
+
+@st.fragment(run_every=1.0)
+def live_results(runner, session_id):
+    jobs = runner.jobs(session_id)
+    if not jobs:
+        return
+
+    done = [j for j in jobs if j['status'] == "done"]
+    st.caption(f"{len(done)} of {len(jobs)} tracks analysed")
+
+    rows = []
+    for job in jobs:
+        res = job['result'] or {}
+        rows.append({
+            "Track": job['name'],
+            "Status": job['status'],
+            "Mayer Score": round(res['mayer'], 3) if res else None,
+            "Period (s)": round(res['period'], 2) if res else None,
+            "Bernardi Match": (8.5 <= res['period'] <= 11.5) if res else None,
+            "Mode": res.get('strategy'),
+            "Error": job['error']
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    if done:
+        df_psd = pd.concat([
+            pd.DataFrame({"Freq (Hz)": j['result']['freqs'], "Power": j['result']['powers'], "Track": j['name']})
+            for j in done
+        ])
+        fig = px.line(df_psd, x="Freq (Hz)", y="Power", color="Track", title="Spectral Analysis")
+        fig.add_vrect(x0=0.05, x1=0.15, fillcolor="red", opacity=0.1)
+        st.plotly_chart(fig, use_container_width=True)
+
 st.title("Bio-Musical Rhythms")
 
 tab1, tab2 = st.tabs(["📊 Analyzer", "🎹 Therapeutic Composer"])
 
 with tab1:
     st.markdown("**Upload existing music to test for entrainment.**")
-    uploaded_file = st.file_uploader("Upload Audio", type=["wav", "mp3"])
-    
-    if uploaded_file is not None:
-        with open("temp_audio.wav", "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        # Process
-        analyzer = SpectralAnalyzer()
-        y = analyzer.load_and_preprocess("temp_audio.wav")
-        envelope = analyzer.extract_envelope(y)
-        freqs, powers = analyzer.compute_psd(envelope)
-        score = calculate_mayer_score(freqs, powers)
-        
-        # Visualize
-        col1, col2 = st.columns(2)
-        col1.metric("Mayer Score", f"{score:.3f}")
-        
-        # Plot Spectrum
-        mask = freqs <= 0.25
-        df_psd = pd.DataFrame({"Freq (Hz)": freqs[mask], "Power": powers[mask]})
-        fig = px.line(df_psd, x="Freq (Hz)", y="Power", title="Spectral Analysis")
-        fig.add_vrect(x0=0.05, x1=0.15, fillcolor="red", opacity=0.1)
-        st.plotly_chart(fig, use_container_width=True)
+    runner = get_runner()
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+    # A new key after each submission empties the uploader, so the same
+    # files are not queued again on the next click
+    upload_key = st.session_state.setdefault("upload_key", 0)
+    uploaded_files = st.file_uploader("Upload Audio", type=["wav", "mp3"], accept_multiple_files=True,
+                                      key=f"uploader_{upload_key}")
+
+    col_run, col_cancel, col_clear = st.columns(3)
+    if col_run.button("Analyze", disabled=not uploaded_files):
+        budget = int(load_config()['dashboard']['memory_budget_gb'] * 1024 ** 3)
+        for uploaded in uploaded_files:
+            path = save_upload(uploaded)
+            runner.submit(session_id, uploaded.name, path, uploaded.name, budget,
+                          cleanup=lambda p=path: os.remove(p))
+        st.session_state["upload_key"] = upload_key + 1
+        st.rerun()
+    if col_cancel.button("Cancel", disabled=not runner.active(session_id)):
+        runner.cancel(session_id)
+    if col_clear.button("Clear finished"):
+        runner.clear(session_id)
+
+    live_results(runner, session_id)
 
 with tab2:
     st.header("Algorithmic Therapy Generator")
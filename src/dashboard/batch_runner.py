@@ -0,0 +1,198 @@
+
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.pipeline import build_track_graph
+from src.utils.scheduler import plan_track
+
+def analyze_upload(path, title, budget_bytes, max_freq=0.25):
+    plan = plan_track(path, budget_bytes, outputs=("period", "mayer"))
+    if plan['strategy'] == "skip":
+        raise MemoryError(f"needs {plan['est_bytes'] / 1024 ** 3:.1f} GB even when cropped")
+
+    graph = build_track_graph(path, title=title, hop_length=plan['hop_length'],
+                              crop_s=plan['crop_s'], strategy=plan['strategy'])
+    res = graph.run(["period", "mayer", "psd"])
+
+    freqs, powers = res['psd']
+    mask = freqs <= max_freq
+    return {
+        "period": float(res['period'][0]),
+        "mayer": float(res['mayer']),
+        "freqs": freqs[mask],
+        "powers": powers[mask],
+        "strategy": plan['strategy']
+    }
+
+class BatchRunner:
+    # Shared by every dashboard session. Each session has its own queue; a
+    # free worker takes the next job from the session with the fewest running
+    # jobs, breaking ties by who was served least recently, so a long
+    # playlist from one user cannot starve the others. With
+    # use_processes the analysis itself runs in a process pool of the same
+    # size; the threads only dispatch and collect. If a worker process dies
+    # the pool is replaced and the jobs it took down are retried once.
+    #
+    # Each session keeps at most max_finished finished jobs, and a session
+    # with nothing in flight is dropped once it has not been polled for
+    # session_ttl_s (the browser tab is gone).
+    def __init__(self, max_workers=2, job_fn=analyze_upload, use_processes=True, max_finished=50, session_ttl_s=3600):
+        self.job_fn = job_fn
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.session_ttl_s = session_ttl_s
+        self.lock = threading.Condition()
+        self.sessions = {}
+        self.tick = 0
+        self.closed = False
+
+        self.pool = self._new_pool() if use_processes else None
+
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(max_workers)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, session_id, name, *args, cleanup=None):
+        job = {"id": uuid.uuid4().hex, "name": name, "status": "queued",
+               "result": None, "error": None, "args": args, "cleanup": cleanup}
+        with self.lock:
+            session = self.sessions.setdefault(session_id, {"jobs": OrderedDict(), "queue": deque(), "running": 0, "served": -1})
+            session['jobs'][job['id']] = job
+            session['queue'].append(job['id'])
+            session['seen'] = time.monotonic()
+            self._evict()
+            self.lock.notify()
+        return job['id']
+
+    def cancel(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return 0
+            cancelled = 0
+            while session['queue']:
+                job = session['jobs'][session['queue'].popleft()]
+                job['status'] = "cancelled"
+                self._cleanup(job)
+                cancelled += 1
+            for job in session['jobs'].values():
+                if job['status'] == "running":
+                    # Cannot interrupt a running analysis; its result is dropped
+                    job['status'] = "cancelling"
+                    cancelled += 1
+            return cancelled
+
+    def clear(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                for job_id in [j for j, job in session['jobs'].items() if job['status'] not in ("queued", "running", "cancelling")]:
+                    del session['jobs'][job_id]
+                if not session['jobs']:
+                    del self.sessions[session_id]
+
+    def jobs(self, session_id):
+        with self.lock:
+            self._evict()
+            session = self.sessions.get(session_id)
+            if session is None:
+                return []
+            session['seen'] = time.monotonic()
+            return [{k: v for k, v in job.items() if k not in ("args", "cleanup", "session")} for job in session['jobs'].values()]
+
+    def active(self, session_id):
+        return any(job['status'] in ("queued", "running", "cancelling") for job in self.jobs(session_id))
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+        for t in self.threads:
+            t.join()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def _next_job(self):
+        # Caller holds the lock
+        waiting = [s for s in self.sessions.values() if s['queue']]
+        if not waiting:
+            return None
+
+        session = min(waiting, key=lambda s: (s['running'], s['served']))
+        session['running'] += 1
+        session['served'] = self.tick
+        self.tick += 1
+
+        job = session['jobs'][session['queue'].popleft()]
+        job['status'] = "running"
+        job['session'] = session
+        return job
+
+    def _work(self):
+        while True:
+            with self.lock:
+                job = self._next_job()
+                while job is None and not self.closed:
+                    self.lock.wait()
+                    job = self._next_job()
+                if job is None:
+                    return
+
+            try:
+                result, error = self._run(job), None
+            except BrokenProcessPool:
+                result, error = None, "worker process died (killed or out of memory)"
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {e}"
+
+            with self.lock:
+                job.pop('session')['running'] -= 1
+                if job['status'] == "cancelling":
+                    job['status'] = "cancelled"
+                else:
+                    job['status'] = "failed" if error else "done"
+                    job['result'], job['error'] = result, error
+                self._cleanup(job)
+                self._evict()
+
+    def _run(self, job):
+        if self.pool is None:
+            return self.job_fn(*job['args'])
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return pool.submit(self.job_fn, *job['args']).result()
+            except BrokenProcessPool:
+                # Every job in flight sees the break; the first to get here
+                # replaces the pool, the rest just retry on the new one
+                with self.lock:
+                    if self.pool is pool and not self.closed:
+                        pool.shutdown(wait=False)
+                        self.pool = self._new_pool()
+                if attempt:
+                    raise
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _evict(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            finished = [j for j, job in session['jobs'].items() if job['status'] in ("done", "failed", "cancelled")]
+            if len(finished) == len(session['jobs']) and now - session['seen'] > self.session_ttl_s:
+                del self.sessions[session_id]
+                continue
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del session['jobs'][job_id]
+
+    def _cleanup(self, job):
+        if job['cleanup']:
+            try:
+                job['cleanup']()
+            except OSError:
+                pass
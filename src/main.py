@@ -1,13 +1,15 @@
 import os
 import sys
 import json
+import argparse
+import hashlib
 import pandas as pd
 import numpy as np
-import librosa
 from glob import glob
-from src.analysis.phrase_detector import PhraseDetector
-from src.analysis.structure import Structure
-from src.visualization.report_plots import ReportPlotter
+from src.pipeline import build_track_graph, parse_outputs
+from src.utils.config_loader import load_config
+from src.utils.scheduler import LAG_OUTPUTS, plan_track, run_within_budget
+from src.utils.work_queue import WorkQueue
 
 # Ensure project root is in path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -30,71 +32,222 @@ def load_meta(path):
         for entry in data
     }
 
-def main():
+def analyze_track(plan, info, params, outputs):
+    path = plan['path']
+    fname = os.path.basename(path)
+    title = info['title']
+
+    print(f"\nAnalyzing: {title} [{plan['strategy']}, hop={plan['hop_length']}]")
+    
+    graph = build_track_graph(path, title=title, hop_length=plan['hop_length'],
+                              crop_s=plan['crop_s'], strategy=plan['strategy'], **params)
+    
+    # Pull everything that needs the lag matrix first, then drop it so the
+    # SSM and figures do not stack on top of the N x N peak.
+    lag_outputs = [o for o in outputs if o in LAG_OUTPUTS]
+    res = graph.run(lag_outputs)
+    graph.release("lag")
+    res.update(graph.run([o for o in outputs if o not in lag_outputs]))
+    
+    row = {
+        "Title": title,
+        "Category": info['category'],
+        "Filename": fname,
+        "Duration_s": round(plan['duration'], 2)
+    }
+    
+    if "period" in res:
+        period, _, ac_norm = res['period']
+        match = (8.5 <= period <= 11.5)
+        print(f"   -> Period: {period:.2f}s | Status: {'MATCH' if match else 'NO MATCH'}")
+        row.update({
+            "Detected_Period_s": round(period, 2),
+            "Bernardi_Compliant": match,
+            "Structural_Strength": round(np.max(ac_norm), 3) if len(ac_norm) > 0 else 0
+        })
+    
+    if "mayer" in res:
+        row["Mayer_Score"] = round(float(res['mayer']), 3)
+    
+    if res.get("significance"):
+        row.update(significance_columns(res['significance']))
+    
+    row.update(schedule_columns(plan))
+    return row
+
+def significance_columns(sig):
+    per, may = sig['period'], sig['mayer']
+    return {
+        "Period_p": round(per['p_value'], 4),
+        "Period_CI_low_s": round(per['ci_low'], 2),
+        "Period_CI_high_s": round(per['ci_high'], 2),
+        "Mayer_p": round(may['p_value'], 4),
+        "Mayer_CI_low": round(may['ci_low'], 3),
+        "Mayer_CI_high": round(may['ci_high'], 3)
+    }
+
+def schedule_columns(plan):
+    return {
+        "Strategy": plan['strategy'],
+        "Hop_Length": plan['hop_length'],
+        "Analysed_s": round(plan['crop_s'] or plan['duration'], 2),
+        "Est_Peak_MB": round(plan['est_bytes'] / 1024 ** 2)
+    }
+
+def skipped_row(plan, info, error=None):
+    if error is None:
+        error = f"needs {plan['est_bytes'] / 1024 ** 3:.1f} GB even when cropped"
+        print(f"Skipping {info['title']}: {error}")
+    else:
+        print(f"Error processing {os.path.basename(plan['path'])}: {error}")
+    return {
+        "Title": info['title'],
+        "Category": info['category'],
+        "Filename": os.path.basename(plan['path']),
+        "Duration_s": round(plan['duration'], 2),
+        "Detected_Period_s": None,
+        "Bernardi_Compliant": False,
+        "Error": error,
+        **schedule_columns(plan)
+    }
+
+def failed_row(task):
+    # A queue task that used up its attempts; it may never have been planned
+    return {
+        "Title": task['title'],
+        "Category": task['category'],
+        "Filename": os.path.basename(task['path']),
+        "Detected_Period_s": None,
+        "Bernardi_Compliant": False,
+        "Error": task.get('last_error')
+    }
+
+def task_id_for(path):
+    fname = os.path.basename(path)
+    stem = "".join(c if c.isalnum() else "_" for c in os.path.splitext(fname)[0])
+    return f"{stem[:60]}_{hashlib.sha1(fname.encode()).hexdigest()[:8]}"
+
+def write_cohort_csv(results, csv_path):
+    if not results:
+        print("No results generated.")
+        return
+
+    df = pd.DataFrame(results)
+    if "Bernardi_Compliant" in df:
+        df = df.sort_values(by=["Bernardi_Compliant", "Title"], ascending=[False, True])
+    else:
+        df = df.sort_values(by="Title")
+    df.to_csv(csv_path, index=False)
+    print(f"\nSaved to {csv_path}")
+    print(df[[c for c in ("Title", "Detected_Period_s", "Mayer_Score", "Bernardi_Compliant", "Strategy") if c in df]].head(10))
+
+def parse_args(argv=None):
+    conf = load_config()
+    parser = argparse.ArgumentParser(description="Bio-Musical Rhythms cohort report")
+    parser.add_argument("--memory-budget-gb", type=float, default=conf['scheduler']['memory_budget_gb'])
+    parser.add_argument("--workers", type=int, default=conf['scheduler']['max_workers'])
+    parser.add_argument("--surrogates", type=int, default=conf['surrogates']['n_surrogates'],
+                        help="Surrogates per track for p-values and CIs (0 disables)")
+    parser.add_argument("--outputs", type=parse_outputs, default="all",
+                        help="Comma-separated outputs, e.g. period,mayer (also: figures, all)")
+    parser.add_argument("--queue", help="Shared queue directory; without --enqueue/--merge, run as a queue worker "
+                             "(one per host: it runs up to --workers tracks within --memory-budget-gb)")
+    parser.add_argument("--data-dir", help="Directory of input tracks (default: data/raw). Queue tasks store paths "
+                             "relative to it, so each host can point it at its own mount of the shared data")
+    parser.add_argument("--enqueue", action="store_true", help="Add --data-dir tracks to --queue and exit")
+    parser.add_argument("--merge", action="store_true", help="Merge --queue results into the cohort CSV and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    conf = load_config()
     print("Starting Report Generation")
     
-    raw_dir = os.path.join(project_root, "data/raw")
+    raw_dir = args.data_dir or os.path.join(project_root, "data/raw")
     json_path = os.path.join(project_root, "data/verification_cohort.json")
     fig_dir = os.path.join(project_root, "results/figures")
     
     meta = load_meta(json_path)
     files = glob(os.path.join(raw_dir, "*.wav")) + glob(os.path.join(raw_dir, "*.mp3"))
     
-    detector = PhraseDetector(sr=22050)
-    structure = Structure(sr=22050)
-    plotter = ReportPlotter(output_dir=fig_dir)
+    params = {
+        "fig_dir": fig_dir,
+        "n_surrogates": args.surrogates,
+        "alpha": conf['surrogates']['alpha'],
+        "seed": conf['surrogates']['seed']
+    }
+    budget = int(args.memory_budget_gb * 1024 ** 3)
+    csv_path = os.path.join(project_root, "results/final_cohort_analysis.csv")
     
-    results = []
-
-    for path in files:
+    def info_for(path):
         fname = os.path.basename(path)
-        info = meta.get(fname, {'title': os.path.splitext(fname)[0][:40], 'category': "Manual Upload"})
-        title = info['title']
-        safe_id = "".join(c if c.isalnum() else "_" for c in title)
-
-        print(f"\nAnalyzing: {title}")
+        return meta.get(fname, {'title': os.path.splitext(fname)[0][:40], 'category': "Manual Upload"})
+    
+    def plan_for(path):
+        return plan_track(path, budget, sr=22050,
+                          hop_length=conf['audio']['hop_length'],
+                          max_hop_length=conf['scheduler']['max_hop_length'],
+                          outputs=args.outputs)
+    
+    if args.queue:
+        queue = WorkQueue(args.queue, **conf['queue'])
+        # Figures from every host land next to the shared results
+        params['fig_dir'] = os.path.join(args.queue, "figures")
         
-        try:
-            y, sr = librosa.load(path, sr=22050)
-            dur = librosa.get_duration(y=y, sr=sr)
-            
-            period, times, ac_norm = detector.detect(y, min_period=8.0, max_period=13.0)
-            
-            freqs, _, p_rhythm = structure.get_modulation(y)
-            
-            y_crop = y[:min(len(y), sr*60)]
-            ssm = structure.get_ssm(y_crop)
-            if isinstance(ssm, tuple): ssm = ssm[0]
-            
-            plotter.plot_autocorrelation_evidence(times, ac_norm, period, title, f"{safe_id}_time.png")
-            plotter.plot_modulation_spectrum(freqs, p_rhythm, title, f"{safe_id}_freq.png")
-            plotter.plot_ssm_structure(ssm, title, f"{safe_id}_ssm.png")
-            
-            match = (8.5 <= period <= 11.5)
-            print(f"   -> Period: {period:.2f}s | Status: {'MATCH' if match else 'NO MATCH'}")
-            
-            results.append({
-                "Title": title,
-                "Category": info['category'],
-                "Filename": fname,
-                "Duration_s": round(dur, 2),
-                "Detected_Period_s": round(period, 2),
-                "Bernardi_Compliant": match,
-                "Structural_Strength": round(np.max(ac_norm), 3) if len(ac_norm) > 0 else 0
-            })
+        if args.enqueue:
+            added = sum(queue.put(task_id_for(path), {"path": os.path.relpath(path, raw_dir), **info_for(path)})
+                        for path in files)
+            print(f"Queued {added} new tracks: {queue.status()}")
+        elif args.merge:
+            print(f"Queue: {queue.status()}")
+            write_cohort_csv(queue.results() + [failed_row(task) for task in queue.failures()], csv_path)
+        else:
+            def run_tasks(claim_next, report):
+                # One worker per host: its tasks share the memory budget and
+                # --workers processes like a local run, and a new task is
+                # claimed whenever a slot frees
+                def next_plan():
+                    while True:
+                        task = claim_next()
+                        if task is None:
+                            return None
+                        try:
+                            plan = dict(plan_for(os.path.join(raw_dir, task['path'])), task=task)
+                        except Exception as e:
+                            report(task['id'], None, f"{type(e).__name__}: {e}")
+                            continue
+                        if plan['strategy'] != "skip":
+                            return plan
+                        report(task['id'], skipped_row(plan, task))
 
+                for plan, row, error in run_within_budget([], analyze_track, budget, args.workers,
+                                                          worker_args=lambda p: (p['task'], params, args.outputs),
+                                                          refill=next_plan):
+                    report(plan['task']['id'], row, error)
+            
+            done = queue.work_pool(run_tasks, args.workers)
+            print(f"\nWorker {queue.worker_id} processed {done} tracks: {queue.status()}")
+        return
+    
+    plans = []
+    for path in files:
+        try:
+            plans.append(plan_for(path))
         except Exception as e:
-            print(f"Error processing {fname}: {e}")
+            print(f"Error reading header of {os.path.basename(path)}: {e}")
+    
+    results = []
+    for plan in plans:
+        if plan['strategy'] == "skip":
+            results.append(skipped_row(plan, info_for(plan['path'])))
 
-    if not results:
-        print("No results generated.")
-        return
+    for plan, row, error in run_within_budget(plans, analyze_track, budget, args.workers,
+                                              worker_args=lambda p: (info_for(p['path']), params, args.outputs)):
+        if row is None:
+            row = skipped_row(plan, info_for(plan['path']), error or "no result")
+        results.append(row)
 
-    df = pd.DataFrame(results).sort_values(by=["Bernardi_Compliant", "Title"], ascending=[False, True])
-    csv_path = os.path.join(project_root, "results/final_cohort_analysis.csv")
-    df.to_csv(csv_path, index=False)
-    print(f"\nSaved to {csv_path}")
-    print(df[["Title", "Detected_Period_s", "Bernardi_Compliant"]].head(10))
+    write_cohort_csv(results, csv_path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,123 @@
+import argparse
+import numpy as np
+import librosa
+import scipy.signal
+from src.analysis.phrase_detector import PhraseDetector
+from src.analysis.structure import Structure
+from src.analysis.mayer_metric import get_mayer_score
+from src.analysis.surrogates import SurrogateTester
+from src.visualization.report_plots import ReportPlotter
+from src.utils.stage_graph import StageGraph
+from src.utils.config_loader import load_config
+
+OUTPUTS = ("period", "mayer", "significance", "fig_time", "fig_freq", "fig_ssm")
+ALIASES = {"figures": ("fig_time", "fig_freq", "fig_ssm"), "all": OUTPUTS}
+
+DEFAULTS = {
+    "sr": 22050,
+    "crop_s": None,
+    "hop_length": 512,
+    "strategy": "full",
+    "min_period": 8.0,
+    "max_period": 13.0,
+    "env_sr": 10,
+    "ssm_seconds": 60,
+    "fig_dir": "results/figures",
+}
+
+# Lag-limited detection covers this many search windows so the surrogate
+# test sees the harmonics. The memory estimate reads it from here.
+LAG_WINDOWS = 3
+
+def parse_outputs(spec):
+    names = []
+    for name in (s.strip() for s in spec.split(",")):
+        if not name:
+            continue
+        for out in ALIASES.get(name, (name,)):
+            if out not in OUTPUTS:
+                raise argparse.ArgumentTypeError(f"Unknown output '{out}', choose from {', '.join(OUTPUTS + tuple(ALIASES))}")
+            if out not in names:
+                names.append(out)
+    return names
+
+def _decode(path, sr, crop_s):
+    y, _ = librosa.load(path, sr=sr, duration=crop_s)
+    return y
+
+def _envelope(y, sr, env_sr):
+    return Structure(sr=sr).get_envelope(y, target_sr=env_sr)
+
+def _chroma(y, sr, hop_length):
+    return PhraseDetector(sr=sr, hop_length=hop_length).chroma(y)
+
+def _lag_seconds(strategy, max_period):
+    # Only the lag-limited matrix depends on the search window
+    return LAG_WINDOWS * max_period if strategy == "lag_limited" else None
+
+def _lag(chroma_stack, sr, hop_length, lag_seconds):
+    detector = PhraseDetector(sr=sr, hop_length=hop_length)
+    if lag_seconds is not None:
+        return detector.lag_matrix_limited(chroma_stack, max_period=lag_seconds)
+    return detector.lag_matrix(chroma_stack)
+
+def _period(curve, sr, hop_length, min_period, max_period):
+    return PhraseDetector(sr=sr, hop_length=hop_length).pick_period(curve, min_period, max_period)
+
+def _psd(env, env_sr):
+    nperseg = min(1024, len(env))
+    return scipy.signal.welch(env, fs=env_sr, nperseg=nperseg, scaling='density')
+
+def _modulation(y, env, sr, env_sr):
+    return Structure(sr=sr).get_modulation(y, env_res=env, target_sr=env_sr)
+
+def _ssm(chroma_stack, sr, hop_length, ssm_seconds):
+    return Structure(sr=sr, hop_length=hop_length).ssm_from_chroma(chroma_stack, seconds=ssm_seconds)
+
+def _significance(lag, env, sr, hop_length, env_sr, min_period, max_period, n_surrogates, alpha, seed):
+    if not n_surrogates:
+        return None
+    tester = SurrogateTester(n_surrogates=n_surrogates, alpha=alpha, env_sr=env_sr, seed=seed)
+    fps = sr / hop_length
+    return {
+        "period": tester.test_period(lag, fps, min_period=min_period, max_period=max_period),
+        "mayer": tester.test_mayer(env)
+    }
+
+def _fig_time(period, fig_dir, title, safe_id):
+    best, times, curve = period
+    return ReportPlotter(output_dir=fig_dir).plot_autocorrelation_evidence(times, curve, best, title, f"{safe_id}_time.png")
+
+def _fig_freq(modulation, fig_dir, title, safe_id):
+    freqs, _, p_rhythm = modulation
+    return ReportPlotter(output_dir=fig_dir).plot_modulation_spectrum(freqs, p_rhythm, title, f"{safe_id}_freq.png")
+
+def _fig_ssm(ssm, sr, hop_length, fig_dir, title, safe_id):
+    return ReportPlotter(output_dir=fig_dir).plot_ssm_structure(ssm, title, f"{safe_id}_ssm.png",
+                                                                sr=sr, hop_length=hop_length)
+
+def build_track_graph(path, title=None, **params):
+    title = title or path
+    safe_id = "".join(c if c.isalnum() else "_" for c in title)
+    surrogates = load_config()['surrogates']
+    defaults = dict(DEFAULTS, n_surrogates=surrogates['n_surrogates'], alpha=surrogates['alpha'], seed=surrogates['seed'])
+    g = StageGraph(**dict(defaults, path=path, title=title, safe_id=safe_id, **params))
+
+    g.derive("lag_seconds", _lag_seconds, ("strategy", "max_period"))
+
+    g.add("audio", _decode, params=("path", "sr", "crop_s"))
+    g.add("envelope", _envelope, ["audio"], ("sr", "env_sr"))
+    g.add("chroma", _chroma, ["audio"], ("sr", "hop_length"))
+    g.add("lag", _lag, ["chroma"], ("sr", "hop_length", "lag_seconds"))
+    g.add("lag_curve", lambda lag: np.sum(lag, axis=1), ["lag"])
+    g.add("period", _period, ["lag_curve"], ("sr", "hop_length", "min_period", "max_period"))
+    g.add("psd", _psd, ["envelope"], ("env_sr",))
+    g.add("mayer", lambda psd: get_mayer_score(*psd), ["psd"])
+    g.add("modulation", _modulation, ["audio", "envelope"], ("sr", "env_sr"))
+    g.add("ssm", _ssm, ["chroma"], ("sr", "hop_length", "ssm_seconds"))
+    g.add("significance", _significance, ["lag", "envelope"],
+          ("sr", "hop_length", "env_sr", "min_period", "max_period", "n_surrogates", "alpha", "seed"))
+    g.add("fig_time", _fig_time, ["period"], ("fig_dir", "title", "safe_id"))
+    g.add("fig_freq", _fig_freq, ["modulation"], ("fig_dir", "title", "safe_id"))
+    g.add("fig_ssm", _fig_ssm, ["ssm"], ("sr", "hop_length", "fig_dir", "title", "safe_id"))
+    return g
@@ -0,0 +1,175 @@
+
+import os
+import numpy as np
+import librosa
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from src.pipeline import DEFAULTS, LAG_WINDOWS, OUTPUTS
+
+# Peak memory is dominated by the dense N x N recurrence matrix. librosa keeps
+# the affinity matrix, its lag projection and temporaries alive at once
+# (measured: ~16 bytes per cell).
+BYTES_PER_CELL = 4
+MATRIX_COPIES = 4
+# Decoded float32 audio plus the larger of the CQT workspace and the Hilbert
+# analytic signal with its FFT buffers (measured: up to ~80 bytes per sample).
+BYTES_PER_SAMPLE = 80
+# Stacked chroma (12 x 10 steps) in float32, plus its normalised copy.
+BYTES_PER_FRAME = 120 * 4 * 2
+# Canvas and artists of a 300 dpi figure.
+FIGURE_BYTES = 100 * 1024 ** 2
+BASE_BYTES = 300 * 1024 ** 2
+
+LAG_OUTPUTS = ("period", "significance", "fig_time")
+
+def n_frames(duration, sr, hop_length):
+    return int(np.ceil(duration * sr / hop_length)) + 1
+
+def estimate_peak_bytes(duration, sr=22050, hop_length=512, strategy="full", outputs=None,
+                        max_period=DEFAULTS["max_period"], ssm_seconds=DEFAULTS["ssm_seconds"]):
+    # The lag matrix is released before the SSM is built, so only the larger
+    # of the two counts; outputs that need neither never build chroma.
+    # Lag-limited detection keeps a lags x N matrix over LAG_WINDOWS search
+    # windows; the SSM covers the first ssm_seconds.
+    outputs = OUTPUTS if outputs is None else outputs
+    needs_lag = any(o in LAG_OUTPUTS for o in outputs)
+    needs_ssm = "fig_ssm" in outputs
+
+    n = n_frames(duration, sr, hop_length)
+    ssm_n = n_frames(min(duration, ssm_seconds), sr, hop_length)
+
+    signal = duration * sr * BYTES_PER_SAMPLE
+    features = n * BYTES_PER_FRAME if needs_lag or needs_ssm else 0
+    ssm = ssm_n ** 2 * BYTES_PER_CELL * MATRIX_COPIES if needs_ssm else 0
+    figure = FIGURE_BYTES if any(o.startswith("fig_") for o in outputs) else 0
+
+    if not needs_lag:
+        matrix = 0
+    elif strategy == "lag_limited":
+        matrix = n * n_frames(LAG_WINDOWS * max_period, sr, hop_length) * BYTES_PER_CELL
+    else:
+        matrix = n ** 2 * BYTES_PER_CELL * MATRIX_COPIES
+
+    return int(BASE_BYTES + signal + features + max(matrix, ssm) + figure)
+
+def max_crop_seconds(budget_bytes, sr=22050, hop_length=512, outputs=None):
+    lo, hi = 0.0, float(DEFAULTS["ssm_seconds"])
+    while estimate_peak_bytes(hi, sr, hop_length, outputs=outputs) <= budget_bytes:
+        lo, hi = hi, hi * 2
+    for _ in range(40):
+        mid = (lo + hi) / 2
+        if estimate_peak_bytes(mid, sr, hop_length, outputs=outputs) <= budget_bytes:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def plan_track(path, budget_bytes, sr=22050, hop_length=512, max_hop_length=2048, min_seconds=30.0, outputs=None):
+    duration = librosa.get_duration(path=path)
+    return plan_duration(duration, budget_bytes, sr, hop_length, max_hop_length, min_seconds, path=path, outputs=outputs)
+
+def plan_duration(duration, budget_bytes, sr=22050, hop_length=512, max_hop_length=2048, min_seconds=30.0, path=None,
+                  outputs=None):
+    plan = {"path": path, "duration": duration, "hop_length": hop_length, "crop_s": None}
+
+    est = estimate_peak_bytes(duration, sr, hop_length, outputs=outputs)
+    if est <= budget_bytes:
+        return dict(plan, strategy="full", est_bytes=est)
+
+    hop = hop_length * 2
+    while hop <= max_hop_length:
+        est = estimate_peak_bytes(duration, sr, hop, outputs=outputs)
+        if est <= budget_bytes:
+            return dict(plan, strategy="coarse_hop", hop_length=hop, est_bytes=est)
+        hop *= 2
+
+    est = estimate_peak_bytes(duration, sr, hop_length, strategy="lag_limited", outputs=outputs)
+    if est <= budget_bytes:
+        return dict(plan, strategy="lag_limited", est_bytes=est)
+
+    crop = max_crop_seconds(budget_bytes, sr, hop_length, outputs=outputs)
+    if crop >= min_seconds:
+        crop = float(int(crop))
+        est = estimate_peak_bytes(crop, sr, hop_length, outputs=outputs)
+        return dict(plan, strategy="crop", crop_s=crop, est_bytes=est)
+
+    return dict(plan, strategy="skip", est_bytes=est)
+
+def run_within_budget(plans, worker, budget_bytes, max_workers=None, worker_args=None, refill=None):
+    # Admits tracks into the pool only while the summed estimates of the
+    # in-flight tracks fit in the budget. Largest tracks go first so they are
+    # not left to run alone at the end; smaller ones fill the gaps.
+    # Yields (plan, result, error) per track. A worker killed by the OS (OOM,
+    # SIGKILL) breaks the whole pool and takes every track in flight with it;
+    # a fresh pool takes the rest of the queue and those tracks go back on it
+    # once, so only a track that breaks the pool twice is reported as failed.
+    # refill, if given, is asked for another plan whenever fewer than
+    # max_workers tracks are running or waiting; it returns None when it has
+    # nothing to give (e.g. a queue worker with no claimable task).
+    max_workers = max_workers or os.cpu_count() or 1
+    queue = sorted((p for p in plans if p["strategy"] != "skip"), key=lambda p: p["est_bytes"], reverse=True)
+
+    running = {}
+    in_use = 0
+    retried = set()
+
+    def top_up():
+        while refill is not None and len(queue) + len(running) < max_workers:
+            plan = refill()
+            if plan is None:
+                break
+            queue.append(plan)
+        queue.sort(key=lambda p: p["est_bytes"], reverse=True)
+
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        top_up()
+        while queue or running:
+            while queue and len(running) < max_workers:
+                # A retried track runs alone, so if it was the one that broke
+                # the pool it cannot take anything else down a second time
+                if any(id(p) in retried for p in running.values()):
+                    break
+                fits = [p for p in queue if in_use + p["est_bytes"] <= budget_bytes
+                        and not (running and id(p) in retried)]
+                if not fits and running:
+                    break
+                nxt = fits[0] if fits else queue[0]
+                extra = worker_args(nxt) if worker_args else ()
+                try:
+                    fut = pool.submit(worker, nxt, *extra)
+                except BrokenProcessPool:
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=max_workers)
+                    fut = pool.submit(worker, nxt, *extra)
+                queue.remove(nxt)
+                running[fut] = nxt
+                in_use += nxt["est_bytes"]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in done:
+                plan = running.pop(fut)
+                in_use -= plan["est_bytes"]
+                try:
+                    result, error = fut.result(), None
+                except BrokenProcessPool:
+                    broken = True
+                    if id(plan) not in retried:
+                        retried.add(id(plan))
+                        queue.append(plan)
+                        queue.sort(key=lambda p: p["est_bytes"], reverse=True)
+                        continue
+                    result, error = None, "worker process died (killed or out of memory)"
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+                yield plan, result, error
+
+            if broken:
+                # Futures still in running belong to the dead pool and will
+                # resolve as broken on the next wait
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+            top_up()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,71 @@
+
+class Stage:
+    def __init__(self, name, fn, inputs=(), params=()):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+
+class StageGraph:
+    # Declarative, lazily evaluated pipeline. Each stage names its input
+    # stages and the parameters it reads; a stage's cache key is built from
+    # its own parameter values and its inputs' keys, so changing a parameter
+    # only invalidates the stages downstream of it. Only the latest result of
+    # each stage is kept, so superseded lag matrices are released. Derived
+    # parameters are computed from other parameters before keying, so a stage
+    # can depend on a combination (e.g. a value that only matters for one
+    # strategy) without being invalidated by its raw ingredients.
+    def __init__(self, **defaults):
+        self.stages = {}
+        self.derived = {}
+        self.defaults = defaults
+        self.cache = {}
+        self.computed = []
+
+    def add(self, name, fn, inputs=(), params=()):
+        for dep in inputs:
+            if dep not in self.stages:
+                raise KeyError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name, fn, inputs, params)
+        return self
+
+    def derive(self, name, fn, params=()):
+        self.derived[name] = (fn, tuple(params))
+        return self
+
+    def release(self, *names):
+        for name in names:
+            self.cache.pop(name, None)
+
+    def run(self, outputs, **params):
+        params = dict(self.defaults, **params)
+        for name, (fn, needs) in self.derived.items():
+            params[name] = fn(**{p: params[p] for p in needs})
+        keys = {}
+        return {name: self._pull(name, params, keys) for name in outputs}
+
+    def clear(self):
+        self.cache.clear()
+        self.computed.clear()
+
+    def _key(self, name, params, keys):
+        if name not in keys:
+            stage = self.stages[name]
+            own = tuple((p, params[p]) for p in stage.params)
+            keys[name] = (name, own, tuple(self._key(dep, params, keys) for dep in stage.inputs))
+        return keys[name]
+
+    def _pull(self, name, params, keys):
+        if name not in self.stages:
+            raise KeyError(f"Unknown stage '{name}'")
+
+        key = self._key(name, params, keys)
+        cached = self.cache.get(name)
+        if cached is None or cached[0] != key:
+            stage = self.stages[name]
+            args = [self._pull(dep, params, keys) for dep in stage.inputs]
+            kwargs = {p: params[p] for p in stage.params}
+            cached = (key, stage.fn(*args, **kwargs))
+            self.cache[name] = cached
+            self.computed.append(name)
+        return cached[1]
@@ -0,0 +1,264 @@
+
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+
+def _to_json(obj):
+    # numpy scalars (np.bool_, np.float64) in result rows
+    return obj.item() if hasattr(obj, "item") else str(obj)
+
+class WorkQueue:
+    # Coordinator-free queue on a shared directory. Every state change is an
+    # atomic rename within the queue root, so exactly one worker wins each
+    # claim or reclaim:
+    #
+    #   pending/<id>.json  --claim-->  claimed/<id>@<worker>.json  --complete-->  results/<id>.json
+    #                                        |
+    #                        lease expired or failed: back to pending/,
+    #                        or to failed/ after max_attempts
+    #
+    # A claim's lease is the mtime of its claimed/ file, refreshed by a
+    # heartbeat thread while the task runs. Leases should be much longer
+    # than the clock skew between hosts. The claim file names its owner, so a
+    # worker whose lease ran out cannot heartbeat, complete or fail a claim
+    # another worker has since taken.
+    STATES = ("pending", "claimed", "results", "failed")
+
+    def __init__(self, root, lease_s=600, max_attempts=3, poll_s=5.0, worker_id=None):
+        self.root = root
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.poll_s = poll_s
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        for state in self.STATES:
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def put(self, task_id, payload):
+        if any(os.path.exists(self._path(state, task_id)) for state in self.STATES) or task_id in self._ids("claimed"):
+            return False
+        self._write(self._path("pending", task_id), dict(payload, id=task_id, attempts=0))
+        return True
+
+    def claim(self):
+        self.reclaim_expired()
+        for task_id in self._ids("pending"):
+            src = self._path("pending", task_id)
+            if os.path.exists(self._path("results", task_id)):
+                self._remove(src)
+                continue
+            try:
+                # Touch before the rename so the new claim never looks stale
+                os.utime(src)
+                os.rename(src, self._path("claimed", task_id))
+            except FileNotFoundError:
+                continue
+            with open(self._path("claimed", task_id)) as f:
+                return task_id, json.load(f)
+        return None
+
+    def heartbeat(self, task_id):
+        try:
+            os.utime(self._path("claimed", task_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def lease(self, task_ids):
+        # Heartbeats every id in task_ids, which the caller may add to or
+        # remove from while the lease is held. Yields the set of ids whose
+        # claim was lost (expired and taken by another worker).
+        stop = threading.Event()
+        lost = set()
+
+        def beat():
+            while not stop.wait(self.lease_s / 3):
+                for task_id in list(task_ids):
+                    if task_id not in lost and not self.heartbeat(task_id):
+                        lost.add(task_id)
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, task_id, result):
+        # Take the claim private first: if it is no longer ours, do nothing
+        claim = self._path("claimed", task_id)
+        private = self._private(claim)
+        try:
+            os.rename(claim, private)
+        except FileNotFoundError:
+            return False
+        self._write(self._path("results", task_id), result)
+        self._remove(private)
+        return True
+
+    def fail(self, task_id, error):
+        return self._requeue(self._path("claimed", task_id), error)
+
+    def reclaim_expired(self):
+        now = time.time()
+        reclaimed = 0
+        # A worker that died half-way through _requeue leaves a private file
+        # behind; put it back under its claimed/ name so it expires normally.
+        for name in os.listdir(os.path.join(self.root, "claimed")):
+            private = os.path.join(self.root, "claimed", name)
+            if name.endswith(".requeue") and self._expired(private, now):
+                try:
+                    os.rename(private, os.path.join(self.root, "claimed", name[1:].split(".json.")[0] + ".json"))
+                except FileNotFoundError:
+                    pass
+        for path in self._claims():
+            if self._expired(path, now) and self._requeue(path, "lease expired"):
+                reclaimed += 1
+        return reclaimed
+
+    def work(self, fn):
+        # Runs fn(payload) on claimed tasks, one at a time, until nothing is
+        # pending or claimed by anyone. fn returns the result dict, or None on
+        # failure.
+        def one_at_a_time(claim_next, report):
+            while True:
+                payload = claim_next()
+                if payload is None:
+                    return
+                try:
+                    result = fn(payload)
+                    report(payload['id'], result, None if result is not None else "no result")
+                except Exception as e:
+                    report(payload['id'], None, f"{type(e).__name__}: {e}")
+
+        return self.work_pool(one_at_a_time, 1)
+
+    def work_pool(self, fn, max_claimed):
+        # Lets fn keep up to max_claimed tasks in flight, so a worker can run
+        # its own pool and take a new task whenever a slot frees.
+        # fn(claim_next, report) runs until claim_next() returns None and its
+        # tasks are done: claim_next() claims another task while fewer than
+        # max_claimed are unreported and returns its payload (or None), and
+        # report(task_id, result, error) completes or fails it. Tasks fn never
+        # reports are failed with the error that stopped it.
+        processed = 0
+        while True:
+            held = set()
+            handled = 0
+
+            with self.lease(held) as lost:
+                def claim_next():
+                    if len(held) >= max_claimed:
+                        return None
+                    claimed = self.claim()
+                    if claimed is None:
+                        return None
+                    held.add(claimed[0])
+                    return claimed[1]
+
+                def report(task_id, result, error=None):
+                    nonlocal processed, handled
+                    held.discard(task_id)
+                    if result is not None:
+                        owned = self.complete(task_id, result)
+                    else:
+                        owned = self.fail(task_id, error or "no result")
+                    if not owned:
+                        lost.add(task_id)
+                    processed += 1
+                    handled += 1
+
+                try:
+                    fn(claim_next, report)
+                    stopped = "no result"
+                except Exception as e:
+                    stopped = f"{type(e).__name__}: {e}"
+                for task_id in sorted(held):
+                    report(task_id, None, stopped)
+
+            for task_id in sorted(lost):
+                print(f"Worker {self.worker_id} lost its lease on {task_id}; another worker took it over")
+
+            if not handled:
+                if not self._ids("pending") and not self._ids("claimed"):
+                    return processed
+                time.sleep(self.poll_s)
+
+    def results(self):
+        return self._load("results")
+
+    def failures(self):
+        # Payloads of tasks that used up max_attempts, with their last_error
+        return self._load("failed")
+
+    def status(self):
+        return {state: len(self._ids(state)) for state in self.STATES}
+
+    def _requeue(self, path, error):
+        # Rename to a private name first so only one worker handles it
+        private = self._private(path)
+        try:
+            os.rename(path, private)
+            # The rename keeps the expired mtime; refresh it so no other
+            # worker's reclaim_expired mistakes this for an abandoned requeue
+            os.utime(private)
+            with open(private) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return False
+        payload['attempts'] = payload.get('attempts', 0) + 1
+        payload['last_error'] = error
+
+        task_id = payload['id']
+        state = "failed" if payload['attempts'] >= self.max_attempts else "pending"
+        if not os.path.exists(self._path("results", task_id)):
+            self._write(self._path(state, task_id), payload)
+        self._remove(private)
+        return True
+
+    def _load(self, state):
+        out = []
+        for task_id in self._ids(state):
+            with open(self._path(state, task_id)) as f:
+                out.append(json.load(f))
+        return out
+
+    def _expired(self, path, now):
+        try:
+            return now - os.stat(path).st_mtime > self.lease_s
+        except FileNotFoundError:
+            return False
+
+    def _path(self, state, task_id):
+        # A claimed/ path is always this worker's own claim
+        if state == "claimed":
+            return os.path.join(self.root, state, f"{task_id}@{self.worker_id}.json")
+        return os.path.join(self.root, state, f"{task_id}.json")
+
+    def _private(self, path):
+        # Left-over private files are restored by reclaim_expired
+        return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{self.worker_id}.requeue")
+
+    def _claims(self):
+        names = os.listdir(os.path.join(self.root, "claimed"))
+        return sorted(os.path.join(self.root, "claimed", n) for n in names if n.endswith(".json") and not n.startswith("."))
+
+    def _ids(self, state):
+        names = os.listdir(os.path.join(self.root, state))
+        return sorted(n[:-5].split("@")[0] for n in names if n.endswith(".json") and not n.startswith("."))
+
+    def _write(self, path, data):
+        tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{self.worker_id}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=4, default=_to_json)
+        os.replace(tmp, path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -53,9 +53,16 @@ class ReportPlotter:
         plt.close()
         return save_path
 
-    def plot_ssm_structure(self, ssm, title, filename):
+    def plot_ssm_structure(self, ssm, title, filename, sr=22050, hop_length=512, max_frames=800):
+        # pcolormesh allocates several objects per cell; block-average the
+        # matrix so the figure costs the same whatever the SSM length.
+        factor = int(np.ceil(ssm.shape[0] / max_frames))
+        if factor > 1:
+            n = ssm.shape[0] // factor * factor
+            ssm = ssm[:n, :n].reshape(n // factor, factor, n // factor, factor).mean(axis=(1, 3))
         fig, ax = plt.subplots(figsize=(8, 8))
-        img = librosa.display.specshow(ssm, x_axis='time', y_axis='time', cmap='magma', ax=ax)
+        img = librosa.display.specshow(ssm, x_axis='time', y_axis='time', sr=sr, hop_length=hop_length * factor,
+                                       cmap='magma', ax=ax)
         ax.set_title(f"Structure (SSM): {title}", fontsize=12, fontweight='bold')
         ax.set_xlabel("Time (s)")
         ax.set_ylabel("Time (s)")
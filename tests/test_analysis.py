@@ -2,6 +2,7 @@ import unittest
 import numpy as np
 from src.analysis.signal_processing import Spectrum
 from src.analysis.mayer_metric import get_mayer_score, get_peak_freq
+from src.analysis.phrase_detector import PhraseDetector
 
 class TestBioRhythms(unittest.TestCase):
     
@@ -37,5 +38,15 @@ class TestBioRhythms(unittest.TestCase):
 
         self.assertLess(score, 0.1)
 
+    def test_lag_limited_does_not_wrap(self):
+        detector = PhraseDetector(sr=100, hop_length=10)
+        feats = np.random.default_rng(0).random((12, 200))
+        lag = detector.lag_matrix_limited(feats, max_period=5.0)
+
+        norm = feats / np.max(np.abs(feats), axis=0)
+        self.assertEqual(lag.shape, (52, 200))
+        self.assertTrue(np.all(lag[20, :20] == 0))
+        np.testing.assert_allclose(lag[20, 20:], np.sum(norm[:, 20:] * norm[:, :-20], axis=0), rtol=1e-5)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+import unittest
+from src.dashboard.batch_runner import BatchRunner
+
+def _die_on(name):
+    if name == "die":
+        os._exit(1)
+    return {"name": name}
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.started = []
+        self.gate = threading.Event()
+
+        def job(name):
+            self.started.append(name)
+            self.gate.wait(5)
+            return {"name": name}
+
+        self.runner = BatchRunner(max_workers=1, job_fn=job, use_processes=False)
+
+    def tearDown(self):
+        self.gate.set()
+        self.runner.shutdown()
+
+    def wait_idle(self, *sessions):
+        deadline = time.time() + 5
+        while any(self.runner.active(s) for s in sessions) and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_sessions_are_served_round_robin(self):
+        for i in range(4):
+            self.runner.submit("big", f"a{i}", f"a{i}")
+        self.runner.submit("small", "b0", "b0")
+        self.gate.set()
+        self.wait_idle("big", "small")
+
+        self.assertLessEqual(self.started.index("b0"), 1)
+        self.assertEqual([j['status'] for j in self.runner.jobs("big")], ["done"] * 4)
+        self.assertEqual(self.runner.jobs("small")[0]['result'], {"name": "b0"})
+
+    def test_cancel_drops_queued_and_running_jobs(self):
+        cleaned = []
+        for i in range(3):
+            self.runner.submit("s", f"t{i}", f"t{i}", cleanup=lambda i=i: cleaned.append(i))
+        while not self.started:
+            time.sleep(0.01)
+
+        self.assertEqual(self.runner.cancel("s"), 3)
+        self.gate.set()
+        self.wait_idle("s")
+
+        self.assertEqual(self.started, ["t0"])
+        self.assertEqual([j['status'] for j in self.runner.jobs("s")], ["cancelled"] * 3)
+        self.assertEqual(sorted(cleaned), [0, 1, 2])
+
+    def test_finished_jobs_are_capped_and_idle_sessions_evicted(self):
+        runner = BatchRunner(max_workers=1, job_fn=lambda name: name, use_processes=False,
+                             max_finished=2, session_ttl_s=0.2)
+        try:
+            for i in range(4):
+                runner.submit("s", f"t{i}", f"t{i}")
+            deadline = time.time() + 5
+            while runner.active("s") and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual([j['name'] for j in runner.jobs("s")], ["t2", "t3"])
+
+            time.sleep(0.3)
+            runner.submit("other", "o", "o")
+            self.assertNotIn("s", runner.sessions)
+        finally:
+            runner.shutdown()
+
+class TestBatchRunnerProcesses(unittest.TestCase):
+
+    def test_dead_worker_fails_only_its_job(self):
+        runner = BatchRunner(max_workers=1, job_fn=_die_on)
+        try:
+            runner.submit("a", "die", "die")
+            runner.submit("b", "ok", "ok")
+            deadline = time.time() + 60
+            while (runner.active("a") or runner.active("b")) and time.time() < deadline:
+                time.sleep(0.05)
+
+            died = runner.jobs("a")[0]
+            self.assertEqual(died['status'], "failed")
+            self.assertIn("died", died['error'])
+            self.assertEqual(runner.jobs("b")[0]['result'], {"name": "ok"})
+
+            runner.submit("b", "again", "again")
+            while runner.active("b") and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(runner.jobs("b")[1]['status'], "done")
+        finally:
+            runner.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import time
+import unittest
+from src.utils.scheduler import estimate_peak_bytes, plan_duration, run_within_budget
+
+GB = 1024 ** 3
+
+def _echo(plan):
+    return plan["path"]
+
+def _crash(plan):
+    if plan["path"] == "die":
+        os._exit(1)
+    if plan["path"] == "slow":
+        time.sleep(1.0)
+    if plan["path"] == "raise":
+        raise ValueError("bad track")
+    return plan["path"]
+
+class TestScheduler(unittest.TestCase):
+
+    def test_estimate_grows_quadratically(self):
+        short = estimate_peak_bytes(600)
+        long = estimate_peak_bytes(1200)
+        self.assertGreater(long, 3 * short)
+        self.assertLess(estimate_peak_bytes(1200, strategy="lag_limited"), long / 10)
+
+    def test_estimate_depends_on_outputs(self):
+        full = estimate_peak_bytes(1200)
+        self.assertLess(estimate_peak_bytes(1200, outputs=["mayer"]), full / 5)
+        self.assertEqual(estimate_peak_bytes(1200, outputs=["period"]) + 100 * 1024 ** 2,
+                         estimate_peak_bytes(1200, outputs=["period", "fig_time"]))
+        self.assertEqual(plan_duration(1200, 4 * GB, outputs=["mayer", "fig_freq"])["strategy"], "full")
+
+    def test_estimate_follows_pipeline_windows(self):
+        limited = estimate_peak_bytes(3600, strategy="lag_limited", outputs=["period"])
+        self.assertGreater(estimate_peak_bytes(3600, strategy="lag_limited", outputs=["period"], max_period=26.0), limited)
+        ssm = estimate_peak_bytes(600, outputs=["fig_ssm"])
+        self.assertGreater(estimate_peak_bytes(600, outputs=["fig_ssm"], ssm_seconds=120), ssm)
+
+    def test_strategy_escalation(self):
+        self.assertEqual(plan_duration(300, 8 * GB)["strategy"], "full")
+
+        coarse = plan_duration(1200, 8 * GB)
+        self.assertEqual(coarse["strategy"], "coarse_hop")
+        self.assertGreater(coarse["hop_length"], 512)
+
+        self.assertEqual(plan_duration(3600, 8 * GB)["strategy"], "lag_limited")
+
+        crop = plan_duration(3600, 2 * GB)
+        self.assertEqual(crop["strategy"], "crop")
+        self.assertLessEqual(crop["est_bytes"], 2 * GB)
+
+        self.assertEqual(plan_duration(3600, 0.1 * GB)["strategy"], "skip")
+
+    def test_run_within_budget(self):
+        plans = [plan_duration(d, 4 * GB, path=str(d)) for d in (60, 120, 240, 10000)]
+        plans[-1]["strategy"] = "skip"
+        done = [res for _, res, _ in run_within_budget(plans, _echo, 4 * GB, max_workers=2)]
+        self.assertEqual(sorted(done), ["120", "240", "60"])
+
+    def test_refill_keeps_slots_full(self):
+        pending = [plan_duration(d, 4 * GB, path=str(d)) for d in (60, 50, 40, 30)]
+        taken = []
+
+        def refill():
+            if not pending:
+                return None
+            taken.append(pending.pop(0))
+            return taken[-1]
+
+        done = []
+        for plan, res, _ in run_within_budget([], _echo, 4 * GB, max_workers=2, refill=refill):
+            self.assertLessEqual(len(taken) - len(done), 2)
+            done.append(res)
+        self.assertEqual(sorted(done), ["30", "40", "50", "60"])
+
+    def test_dead_worker_does_not_lose_results(self):
+        plans = [plan_duration(d, 4 * GB, path=p) for d, p in ((300, "die"), (200, "raise"), (100, "a"), (60, "b"))]
+        out = {plan["path"]: (res, err) for plan, res, err in run_within_budget(plans, _crash, 4 * GB, max_workers=1)}
+
+        self.assertEqual(out["a"], ("a", None))
+        self.assertEqual(out["b"], ("b", None))
+        self.assertIsNone(out["die"][0])
+        self.assertIn("died", out["die"][1])
+        self.assertEqual(out["raise"][1], "ValueError: bad track")
+
+    def test_tracks_taken_down_by_a_dead_worker_are_retried(self):
+        plans = [plan_duration(d, 4 * GB, path=p) for d, p in ((60, "slow"), (30, "die"))]
+        out = {plan["path"]: (res, err) for plan, res, err in run_within_budget(plans, _crash, 4 * GB, max_workers=2)}
+
+        self.assertEqual(out["slow"], ("slow", None))
+        self.assertIn("died", out["die"][1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import argparse
+import unittest
+import numpy as np
+from src.utils.stage_graph import StageGraph
+from src.pipeline import build_track_graph, parse_outputs
+from src.utils.config_loader import load_config
+
+class TestStageGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = StageGraph(scale=2, offset=1)
+        self.graph.add("source", lambda: [1, 2, 3])
+        self.graph.add("scaled", lambda xs, scale: [x * scale for x in xs], ["source"], ("scale",))
+        self.graph.add("shifted", lambda xs, offset: [x + offset for x in xs], ["source"], ("offset",))
+        self.graph.add("total", lambda a, b: sum(a) + sum(b), ["scaled", "shifted"])
+
+    def test_pulls_only_requested_stages(self):
+        out = self.graph.run(["scaled"])
+        self.assertEqual(out, {"scaled": [2, 4, 6]})
+        self.assertEqual(self.graph.computed, ["source", "scaled"])
+
+    def test_memoised_within_run(self):
+        self.graph.run(["total"])
+        self.graph.run(["total", "scaled"])
+        self.assertEqual(sorted(self.graph.computed), ["scaled", "shifted", "source", "total"])
+
+    def test_parameter_change_recomputes_downstream_only(self):
+        self.graph.run(["total"])
+        self.graph.computed.clear()
+        out = self.graph.run(["total"], offset=10)
+        self.assertEqual(out["total"], 12 + 36)
+        self.assertEqual(self.graph.computed, ["shifted", "total"])
+
+    def test_parse_outputs(self):
+        self.assertEqual(parse_outputs("period, mayer"), ["period", "mayer"])
+        self.assertEqual(parse_outputs("period,figures")[1:], ["fig_time", "fig_freq", "fig_ssm"])
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_outputs("tempo")
+
+    def test_derived_parameter_keys_only_what_it_uses(self):
+        self.graph.derive("limit", lambda mode, window: window if mode == "limited" else None, ("mode", "window"))
+        self.graph.add("limited", lambda xs, limit: xs[:limit], ["source"], ("limit",))
+
+        self.graph.run(["limited"], mode="full", window=1)
+        self.graph.computed.clear()
+        self.assertEqual(self.graph.run(["limited"], mode="full", window=2)["limited"], [1, 2, 3])
+        self.assertEqual(self.graph.computed, [])
+        self.assertEqual(self.graph.run(["limited"], mode="limited", window=2)["limited"], [1, 2])
+
+    def test_full_lag_ignores_search_window(self):
+        graph = build_track_graph("track.wav")
+        graph.stages["audio"].fn = lambda path, sr, crop_s: None
+        graph.stages["chroma"].fn = lambda y, sr, hop_length: np.random.default_rng(0).random((12, 50))
+
+        graph.run(["lag"], max_period=13.0)
+        graph.run(["lag"], max_period=20.0)
+        self.assertEqual(graph.computed.count("lag"), 1)
+
+        graph.run(["lag"], max_period=20.0, strategy="lag_limited")
+        graph.run(["lag"], max_period=1.0, strategy="lag_limited")
+        self.assertEqual(graph.computed.count("lag"), 3)
+
+    def test_significance_uses_envelope_rate(self):
+        graph = build_track_graph("track.wav", env_sr=20, n_surrogates=20)
+        t = np.arange(3000) / 20
+        graph.stages["envelope"].fn = lambda y, sr, env_sr: 1 + np.sin(2 * np.pi * 0.1 * t)
+        graph.stages["lag"].fn = lambda chroma_stack, sr, hop_length, lag_seconds: np.ones((10, 10))
+        graph.stages["audio"].fn = lambda path, sr, crop_s: None
+        graph.stages["chroma"].fn = lambda y, sr, hop_length: None
+
+        res = graph.run(["mayer", "significance"])
+        self.assertAlmostEqual(res["significance"]["mayer"]["score"], float(res["mayer"]), places=5)
+
+    def test_modulation_uses_envelope_rate(self):
+        sr, t = 1000, np.arange(300 * 1000) / 1000
+        y = (1 + np.sin(2 * np.pi * 0.1 * t)) * np.sin(2 * np.pi * 100 * t)
+        for env_sr in (10, 20):
+            graph = build_track_graph("track.wav", sr=sr, env_sr=env_sr)
+            graph.stages["audio"].fn = lambda path, sr, crop_s: y
+            freqs, p_vol, _ = graph.run(["modulation"])["modulation"]
+            self.assertAlmostEqual(freqs[np.argmax(p_vol[1:]) + 1], 0.1, delta=0.02)
+
+    def test_surrogate_defaults_come_from_config(self):
+        conf = load_config()['surrogates']
+        graph = build_track_graph("track.wav")
+        self.assertEqual([graph.defaults[k] for k in ("n_surrogates", "alpha", "seed")],
+                         [conf['n_surrogates'], conf['alpha'], conf['seed']])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+import scipy.signal
+from src.analysis.signal_processing import Spectrum
+from src.analysis.surrogates import SurrogateTester, phase_randomise
+
+class TestSurrogates(unittest.TestCase):
+
+    def setUp(self):
+        self.tester = SurrogateTester(n_surrogates=200, seed=0)
+        self.rng = np.random.default_rng(0)
+
+    def test_phase_randomise_keeps_spectrum(self):
+        x = self.rng.normal(size=512)
+        sur = phase_randomise(x, 8, self.rng)
+        self.assertEqual(sur.shape, (8, 512))
+        np.testing.assert_allclose(np.abs(np.fft.rfft(sur, axis=-1)), np.abs(np.fft.rfft(x - x.mean()))[None, :].repeat(8, 0), atol=1e-8)
+
+    def test_mayer_wave_is_significant(self):
+        signal = Spectrum().make_signal(hz=0.1) + self.rng.normal(0, 0.5, 3000)
+        res = self.tester.test_mayer(signal)
+        self.assertLess(res['p_value'], 0.05)
+        self.assertLessEqual(res['ci_low'], res['score'])
+        self.assertGreaterEqual(res['ci_high'], res['score'])
+
+        control = Spectrum().make_signal(hz=0.5) + self.rng.normal(0, 0.5, 3000)
+        self.assertGreater(self.tester.test_mayer(control)['p_value'], 0.05)
+
+    def test_short_track_gets_mayer_ci(self):
+        t = np.arange(600) / 10
+        res = self.tester.test_mayer(1 + 0.5 * np.sin(2 * np.pi * 0.1 * t) + self.rng.normal(0, 1.0, 600))
+        self.assertTrue(np.isfinite(res['ci_low']) and np.isfinite(res['ci_high']))
+        self.assertLess(res['ci_low'], res['score'])
+        self.assertGreater(res['ci_high'], res['score'])
+
+    def test_mayer_red_noise_is_calibrated(self):
+        # True AR(1) input must be rejected at about the nominal rate
+        tester = SurrogateTester(n_surrogates=100, seed=1)
+        p = []
+        for _ in range(200):
+            x = scipy.signal.lfilter([1.0], [1.0, -0.9], self.rng.normal(size=2300))[500:]
+            p.append(tester.test_mayer(x)['p_value'])
+        rate = np.mean(np.array(p) < 0.05)
+        self.assertGreater(rate, 0.01)
+        self.assertLess(rate, 0.10)
+
+    def test_periodic_lag_curve(self):
+        fps, n = 10, 1200
+        lag = self.rng.random((n, n)) * 0.1
+        lag[[100, 200, 300]] += 1.0
+
+        res = self.tester.test_period(lag, fps)
+        self.assertAlmostEqual(res['period'], 10.0, delta=0.1)
+        self.assertLess(res['p_value'], 0.05)
+        self.assertLessEqual(res['ci_low'], 10.0)
+        self.assertGreaterEqual(res['ci_high'], 10.0)
+
+        noise = self.rng.random((n, n))
+        self.assertGreater(self.tester.test_period(noise, fps)['p_value'], 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import tempfile
+import unittest
+import builtins
+import multiprocessing
+from unittest import mock
+from src.utils.work_queue import WorkQueue
+
+def _square(task):
+    time.sleep(0.01)
+    return {"id": task['id'], "value": task['n'] ** 2}
+
+def _worker(root):
+    WorkQueue(root, lease_s=5, poll_s=0.05).work(_square)
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parallel_workers_process_each_task_once(self):
+        queue = WorkQueue(self.root)
+        for n in range(40):
+            self.assertTrue(queue.put(f"t{n:02d}", {"n": n}))
+        self.assertFalse(queue.put("t00", {"n": 0}))
+
+        procs = [multiprocessing.Process(target=_worker, args=(self.root,)) for _ in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=60)
+
+        results = queue.results()
+        self.assertEqual(sorted(r['value'] for r in results), [n ** 2 for n in range(40)])
+        self.assertEqual(queue.status(), {"pending": 0, "claimed": 0, "results": 40, "failed": 0})
+
+    def test_expired_lease_is_reclaimed(self):
+        dead = WorkQueue(self.root, lease_s=0.2, worker_id="dead")
+        dead.put("a", {"n": 3})
+        self.assertEqual(dead.claim()[0], "a")
+
+        alive = WorkQueue(self.root, lease_s=0.2, poll_s=0.05, worker_id="alive")
+        self.assertIsNone(alive.claim())
+        time.sleep(0.3)
+        self.assertEqual(alive.work(_square), 1)
+        self.assertEqual(alive.results()[0]['value'], 9)
+
+    def test_requeue_survives_concurrent_reclaim(self):
+        first = WorkQueue(self.root, lease_s=0.2, worker_id="first")
+        second = WorkQueue(self.root, lease_s=0.2, worker_id="second")
+        first.put("a", {"n": 3})
+        first.claim()
+        old = time.time() - 10
+        os.utime(os.path.join(self.root, "claimed", "a@first.json"), (old, old))
+
+        raced = []
+        def racing_open(path, *args, **kwargs):
+            # The other worker reclaims between our rename and our read
+            if path.endswith(".requeue") and not raced:
+                raced.append(second.reclaim_expired())
+            return builtins.open(path, *args, **kwargs)
+
+        with mock.patch("src.utils.work_queue.open", racing_open, create=True):
+            self.assertEqual(first.reclaim_expired(), 1)
+        self.assertEqual(raced, [0])
+        self.assertEqual(first.status(), {"pending": 1, "claimed": 0, "results": 0, "failed": 0})
+
+        def vanishing_open(path, *args, **kwargs):
+            os.remove(path)
+            return builtins.open(path, *args, **kwargs)
+
+        first.claim()
+        with mock.patch("src.utils.work_queue.open", vanishing_open, create=True):
+            first.fail("a", "boom")
+        self.assertEqual(first.status()['claimed'], 0)
+
+    def test_work_pool_refills_free_slots(self):
+        queue = WorkQueue(self.root, max_attempts=1, poll_s=0.01)
+        for n in range(5):
+            queue.put(f"t{n}", {"n": n})
+
+        rounds = []
+
+        def run(claim_next, report):
+            rounds.append(1)
+            if len(rounds) > 1:
+                while (task := claim_next()) is not None:
+                    report(task['id'], _square(task))
+                return
+            slow, fast = claim_next(), claim_next()
+            self.assertIsNone(claim_next())
+            report(fast['id'], _square(fast))
+            # The slow task is still running; its slot-mate's is free again
+            nxt = claim_next()
+            self.assertEqual(nxt['n'], 2)
+            report(nxt['id'], None, "bad track")
+            report(slow['id'], _square(slow))
+            claim_next()
+            raise RuntimeError("pool gone")
+
+        queue.work_pool(run, 2)
+        self.assertEqual(queue.status(), {"pending": 0, "claimed": 0, "results": 3, "failed": 2})
+        errors = {t['id']: t['last_error'] for t in queue.failures()}
+        self.assertEqual(errors, {"t2": "bad track", "t3": "RuntimeError: pool gone"})
+
+    def test_stale_worker_cannot_touch_new_claim(self):
+        stale = WorkQueue(self.root, lease_s=0.2, worker_id="stale")
+        live = WorkQueue(self.root, lease_s=0.2, worker_id="live")
+        stale.put("a", {"n": 3})
+        stale.claim()
+        time.sleep(0.3)
+        self.assertEqual(live.claim()[0], "a")
+
+        self.assertFalse(stale.heartbeat("a"))
+        self.assertFalse(stale.fail("a", "late"))
+        self.assertFalse(stale.complete("a", {"value": 0}))
+        self.assertEqual(live.status(), {"pending": 0, "claimed": 1, "results": 0, "failed": 0})
+        self.assertTrue(live.heartbeat("a"))
+
+        with stale.lease({"a"}) as lost:
+            time.sleep(0.15)
+        self.assertEqual(lost, {"a"})
+
+        self.assertTrue(live.complete("a", {"value": 9}))
+        self.assertEqual(live.results(), [{"value": 9}])
+
+    def test_failing_task_ends_in_failed(self):
+        queue = WorkQueue(self.root, max_attempts=2, poll_s=0.01)
+        queue.put("bad", {"n": 1})
+        queue.work(lambda task: None)
+        self.assertEqual(queue.status()['failed'], 1)
+        failed = queue.failures()
+        self.assertEqual([(t['id'], t['attempts'], t['last_error']) for t in failed], [("bad", 2, "no result")])
+
+if __name__ == '__main__':
+    unittest.main()